@@ -0,0 +1,91 @@
+"""
+Concurrent load benchmark for the database layer.
+
+Drives the Flask app in-process with N threads doing a storefront mix
+(product listings + checkouts) and reports throughput, latency and errors.
+The same script runs against both backends:
+
+    SQLITE_DATABASE=/tmp/bench.db python bench_db.py --threads 8 --seconds 10
+    DATABASE_URL=postgresql://... python bench_db.py --threads 8 --seconds 10
+
+WARNING: it creates real orders. Point it at a scratch database.
+"""
+import argparse
+import random
+import threading
+import time
+
+from app import app, DATABASE_URL
+
+ORDER = {
+    'total': 45.0,
+    'whatsapp': '5511999999999',
+    'mensagem_whatsapp': 'bench',
+    'items': [
+        {'produto_id': 1, 'tipo': 'inteira', 'quantidade': 1, 'preco_unitario': 45.0},
+        {'produto_id': 2, 'tipo': 'meia', 'quantidade': 1, 'preco_unitario': 26.0,
+         'meias': ['Calabresa', 'Portuguesa']},
+    ]
+}
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def worker(deadline, write_ratio, results, lock):
+    client = app.test_client()
+    local = {'read': [], 'write': [], 'errors': {}}
+    while time.monotonic() < deadline:
+        is_write = random.random() < write_ratio
+        start = time.perf_counter()
+        if is_write:
+            response = client.post('/api/pedidos', json=ORDER)
+        else:
+            response = client.get('/api/produtos')
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            key = f"{response.status_code} {(response.get_json(silent=True) or {}).get('error', '')}"[:80]
+            local['errors'][key] = local['errors'].get(key, 0) + 1
+        else:
+            local['write' if is_write else 'read'].append(elapsed)
+    with lock:
+        results['read'] += local['read']
+        results['write'] += local['write']
+        for key, count in local['errors'].items():
+            results['errors'][key] = results['errors'].get(key, 0) + count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    backend = 'PostgreSQL' if DATABASE_URL else 'SQLite'
+    print(f"Benchmarking {backend}: {args.threads} threads, {args.seconds}s, {args.write_ratio:.0%} writes")
+
+    results = {'read': [], 'write': [], 'errors': {}}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=worker, args=(deadline, args.write_ratio, results, lock))
+               for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    total = len(results['read']) + len(results['write'])
+    print(f"\n{'':8}{'ok':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind in ('read', 'write'):
+        values = results[kind]
+        print(f"{kind:8}{len(values):>8}{percentile(values, 0.5):>10.1f}{percentile(values, 0.99):>10.1f}")
+    print(f"\nThroughput: {total / args.seconds:.0f} req/s")
+    errors = sum(results['errors'].values())
+    print(f"Errors: {errors}")
+    for key, count in sorted(results['errors'].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>6}  {key}")
+
+if __name__ == '__main__':
+    main()
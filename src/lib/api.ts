@@ -6,13 +6,63 @@ const API_URL = 'https://mediterranea.onrender.com/api';
 
 export const api = axios.create({
   baseURL: API_URL,
+  // Send the read-your-writes cookie (db_pin) set by the API after writes
+  withCredentials: true,
 });
 
+// Admin routes require the signed token returned by /admin/login
+api.interceptors.request.use((config) => {
+  const token = localStorage.getItem('admin_token');
+  if (token && config.url?.startsWith('/admin/')) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+api.interceptors.response.use(
+  (response) => response,
+  (error) => {
+    // Expired or invalid token: back to the login screen
+    const url: string = error.config?.url || '';
+    if (error.response?.status === 401 && url.startsWith('/admin/') && url !== '/admin/login') {
+      localStorage.removeItem('admin_token');
+      window.location.href = '/admin';
+    }
+    return Promise.reject(error);
+  }
+);
+
+// Storefront first paint: categories and active products by category in one request. Shared by the pages of a visit and refreshed after BOOTSTRAP_TTL_MS.
+const BOOTSTRAP_TTL_MS = 30_000;
+let bootstrapCache: { at: number; promise: Promise<any> } | null = null;
+
+export const getBootstrap = () => {
+  if (!bootstrapCache || Date.now() - bootstrapCache.at > BOOTSTRAP_TTL_MS) {
+    const promise = api.get('/bootstrap').then((response) => response.data);
+    promise.catch(() => { bootstrapCache = null; });
+    bootstrapCache = { at: Date.now(), promise };
+  }
+  return bootstrapCache.promise;
+};
+
+// Open/closed right now, computed server-side in the shop's timezone. Never cached:
+// it changes at the scheduled opening and closing times.
+export const getShopStatus = async () => {
+  const response = await api.get('/loja/status');
+  return response.data as { isOpen: boolean; message: string; status: string };
+};
+
 export const getProducts = async () => {
   const response = await api.get('/produtos');
   return response.data;
 };
 
+// Ranked search over product names and descriptions (accent-insensitive, prefixes match)
+export const searchProducts = async (q: string, limite = 20) => {
+  const response = await api.get('/produtos/search', { params: { q, limite } });
+  return response.data;
+};
+
 export const createOrder = async (orderData: any) => {
   const response = await api.post('/pedidos', orderData);
   return response.data;
@@ -46,6 +96,13 @@ export const updateAdminProduct = async (id: number, productData: FormData) => {
   return response.data;
 };
 
+// Partial updates for many products in one request (preco_inteiro, preco_meia,
+// ativo, quantidade_estoque). Returns only the rows that actually changed.
+export const batchUpdateAdminProducts = async (updates: Array<{ id: number } & Record<string, any>>) => {
+  const response = await api.patch('/admin/produtos', updates);
+  return response.data;
+};
+
 export const deleteAdminProduct = async (id: number) => {
   const response = await api.delete(`/admin/produtos/${id}`);
   return response.data;
@@ -61,6 +118,25 @@ export const updateOrderStatus = async (id: number, status: string) => {
   return response.data;
 };
 
+// Moves many orders to one status in a single request. With expectedStatus, orders
+// not currently in it are skipped. Returns the changed orders with their new versao.
+export const bulkUpdateOrderStatus = async (ids: number[], status: string, expectedStatus?: string | string[]) => {
+  const response = await api.patch('/admin/pedidos/status', { ids, status, status_atual: expectedStatus });
+  return response.data as {
+    atualizados: Array<{ id: number; status: string; versao: number }>;
+    ignorados: number[];
+    count: number;
+  };
+};
+
+// Live order feed (Server-Sent Events). The browser resends Last-Event-ID
+// on reconnect, so only the missed deltas are replayed.
+// EventSource cannot send headers, so the token goes in the query string.
+export const openOrdersStream = () => {
+  const token = localStorage.getItem('admin_token') || '';
+  return new EventSource(`${API_URL}/admin/pedidos/stream?token=${encodeURIComponent(token)}`);
+};
+
 export const getAdminConfigs = async () => {
   const response = await api.get('/admin/configuracoes');
   return response.data;
@@ -2,7 +2,7 @@ import React, { useMemo, useEffect, useState } from 'react';
 import Layout from '../components/Layout';
 import { useStore } from '../store/useStore';
 import { Trash2, ArrowLeft, MessageCircle, Plus, Minus, Clock, Lock } from 'lucide-react';
-import { createOrder, getAdminConfigs } from '../lib/api';
+import { createOrder, getShopStatus } from '../lib/api';
 import { Link } from 'react-router-dom';
 
 const Cart: React.FC = () => {
@@ -13,69 +13,9 @@ const Cart: React.FC = () => {
   useEffect(() => {
     const checkShopStatus = async () => {
       try {
-        const configs = await getAdminConfigs();
-        const configMap: Record<string, string> = {};
-        configs.forEach((c: any) => configMap[c.chave] = c.valor);
-
-        const status = configMap['shop_status'] || 'auto';
-        
-        if (status === 'open') {
-          setShopStatus({ isOpen: true, message: '' });
-        } else if (status === 'closed') {
-          setShopStatus({ isOpen: false, message: configMap['closing_msg'] || 'Fechado temporariamente.' });
-        } else {
-          // Auto logic
-          const now = new Date();
-          const currentDay = now.getDay(); // 0=Sun
-          const currentHour = now.getHours();
-
-          const openDay = parseInt(configMap['schedule_open_day'] || '4'); // Default Thu
-          const openHour = parseInt(configMap['schedule_open_hour'] || '8');
-          const closeDay = parseInt(configMap['schedule_close_day'] || '4');
-          const closeHour = parseInt(configMap['schedule_close_hour'] || '16');
-
-          // Simple logic: Assuming weekly cycle.
-          // Since user said "Open Thursday morning -> Close Thursday 16:00", this is a window within the week.
-          // We need to check if NOW is inside the [OpenTime, CloseTime] window.
-          
-          // Let's normalize everything to "minutes from start of week" for easy comparison?
-          // Or just simple checks if start/end days are same or different.
-          
-          // Case 1: Same day window (e.g. Thu 08:00 to Thu 16:00)
-          let isOpen = false;
-          
-          if (openDay === closeDay) {
-            if (currentDay === openDay) {
-              if (currentHour >= openHour && currentHour < closeHour) {
-                isOpen = true;
-              }
-            }
-          } 
-          // Case 2: Multi-day window (e.g. Thu 08:00 to Fri 16:00)
-          else if (closeDay > openDay) {
-             if (currentDay > openDay && currentDay < closeDay) {
-               isOpen = true;
-             } else if (currentDay === openDay && currentHour >= openHour) {
-               isOpen = true;
-             } else if (currentDay === closeDay && currentHour < closeHour) {
-               isOpen = true;
-             }
-          }
-          // Case 3: Wrapping week (e.g. Fri to Mon) - Not implemented for simplicity unless requested, assume standard week.
-
-          // Message logic
-          let msg = '';
-          if (!isOpen) {
-             // If before opening
-             if (currentDay < openDay || (currentDay === openDay && currentHour < openHour)) {
-               msg = configMap['opening_msg'] || 'Aguarde a abertura dos pedidos.';
-             } else {
-               msg = configMap['closing_msg'] || 'Pedidos encerrados.';
-             }
-          }
-
-          setShopStatus({ isOpen, message: msg });
-        }
+        // Open/closed is computed server-side in the shop's timezone, live on every visit
+        const loja = await getShopStatus();
+        setShopStatus({ isOpen: loja.isOpen, message: loja.message });
       } catch (err) {
         console.error(err);
         // Fallback to open in case of error to not block business
@@ -2,7 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import Layout from '../components/Layout';
 import { ChevronRight } from 'lucide-react';
-import { getCategories } from '../lib/api';
+import { getBootstrap } from '../lib/api';
 import ImageWithFallback from '../components/ImageWithFallback';
 
 interface Category {
@@ -20,7 +20,7 @@ const Home: React.FC = () => {
   useEffect(() => {
     const fetchCats = async () => {
       try {
-        const data = await getCategories();
+        const { categorias: data } = await getBootstrap();
         // Map API data to component format
         const mappedData = data.map((cat: any) => {
            let accent = 'bg-terracotta';
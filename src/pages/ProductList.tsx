@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import Layout from '../components/Layout';
-import { getProducts } from '../lib/api';
+import { getBootstrap } from '../lib/api';
 import { Product, useStore } from '../store/useStore';
 import { Plus, ArrowLeft, Check, ShoppingCart } from 'lucide-react';
 import { v4 as uuidv4 } from 'uuid';
@@ -20,12 +20,12 @@ const ProductList: React.FC = () => {
   useEffect(() => {
     const fetchProducts = async () => {
       try {
-        const data = await getProducts();
+        const data = await getBootstrap();
         const catMap: Record<string, number> = {
           'Pizzas': 1, 'Salames': 2, 'Conservas': 3, 'Sobremesas': 4
         };
         const catId = catMap[nome || ''] || 0;
-        setProducts(data.filter((p: Product) => p.categoria_id === catId));
+        setProducts(data.produtos_por_categoria[String(catId)] || []);
       } catch (error) {
         console.error("Error fetching products:", error);
       } finally {
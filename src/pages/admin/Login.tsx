@@ -12,7 +12,7 @@ const Login: React.FC = () => {
     e.preventDefault();
     try {
       const data = await adminLogin({ email, senha: password });
-      localStorage.setItem('admin_token', data.token); // Dummy token for now
+      localStorage.setItem('admin_token', data.token); // Signed, expiring token
       navigate('/admin/dashboard');
     } catch (err) {
       setError('Credenciais inválidas');
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { getAdminOrders, updateOrderStatus } from '../../lib/api';
+import { getAdminOrders, updateOrderStatus, bulkUpdateOrderStatus, openOrdersStream } from '../../lib/api';
 import { Link } from 'react-router-dom';
 
 interface OrderItem {
@@ -15,12 +15,33 @@ interface Order {
   data_hora: string;
   total: number;
   status: string;
+  versao?: number;
   whatsapp_cliente: string;
   items: OrderItem[];
 }
 
+type StatusChange = { id: number; status: string; versao?: number };
+
+// Bulk actions only move orders that are still in the previous step of the workflow
+const BULK_EXPECTED: Record<string, string | undefined> = {
+  'Em preparo': 'Recebido',
+  'Finalizado': 'Em preparo',
+  'Cancelado': undefined,
+};
+
+// Apply status changes, ignoring any that are older than what we already have
+const applyChanges = (orders: Order[], changes: StatusChange[]) => {
+  const byId = new Map(changes.map((c) => [c.id, c]));
+  return orders.map((o) => {
+    const c = byId.get(o.id);
+    if (!c || (c.versao !== undefined && o.versao !== undefined && c.versao < o.versao)) return o;
+    return { ...o, status: c.status, versao: c.versao ?? o.versao };
+  });
+};
+
 const Orders: React.FC = () => {
   const [orders, setOrders] = useState<Order[]>([]);
+  const [selected, setSelected] = useState<Set<number>>(new Set());
 
   const fetchOrders = async () => {
     const data = await getAdminOrders();
@@ -29,11 +50,43 @@ const Orders: React.FC = () => {
 
   useEffect(() => {
     fetchOrders();
+
+    // Apply new orders and status changes as they happen instead of polling
+    const stream = openOrdersStream();
+    stream.addEventListener('pedido_criado', (e) => {
+      const order: Order = JSON.parse((e as MessageEvent).data);
+      setOrders((prev) => [order, ...prev.filter((o) => o.id !== order.id)]);
+    });
+    stream.addEventListener('pedido_atualizado', (e) => {
+      const change: StatusChange = JSON.parse((e as MessageEvent).data);
+      setOrders((prev) => applyChanges(prev, [{ ...change, versao: change.versao ?? undefined }]));
+    });
+    // Server could not replay from our Last-Event-ID: reload everything once
+    stream.addEventListener('resync', () => fetchOrders());
+
+    return () => stream.close();
   }, []);
 
   const handleStatusChange = async (id: number, status: string) => {
-    await updateOrderStatus(id, status);
-    fetchOrders();
+    const { versao } = await updateOrderStatus(id, status);
+    setOrders((prev) => applyChanges(prev, [{ id, status, versao: versao ?? undefined }]));
+  };
+
+  const toggleSelected = (id: number) => {
+    setSelected((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) next.delete(id); else next.add(id);
+      return next;
+    });
+  };
+
+  const handleBulkStatus = async (status: string) => {
+    const result = await bulkUpdateOrderStatus([...selected], status, BULK_EXPECTED[status]);
+    setOrders((prev) => applyChanges(prev, result.atualizados));
+    setSelected(new Set(result.ignorados));
+    if (result.ignorados.length) {
+      alert(`${result.ignorados.length} pedido(s) não estavam em "${BULK_EXPECTED[status]}" e não foram alterados.`);
+    }
   };
 
   const getStatusColor = (status: string) => {
@@ -54,10 +107,34 @@ const Orders: React.FC = () => {
       </div>
 
       <div className="p-4 max-w-4xl mx-auto space-y-4">
+        {selected.size > 0 && (
+          <div className="sticky top-0 z-10 bg-white p-4 rounded-xl shadow-sm flex flex-wrap items-center gap-2">
+            <span className="font-bold text-sm mr-auto">{selected.size} selecionado(s)</span>
+            {Object.keys(BULK_EXPECTED).map((status) => (
+              <button
+                key={status}
+                className="text-sm border rounded px-3 py-1 hover:bg-zinc-100"
+                onClick={() => handleBulkStatus(status)}
+              >
+                {status}
+              </button>
+            ))}
+            <button className="text-sm text-zinc-500 px-2" onClick={() => setSelected(new Set())}>
+              Limpar
+            </button>
+          </div>
+        )}
+
         {orders.map((order) => (
           <div key={order.id} className="bg-white p-6 rounded-xl shadow-sm">
             <div className="flex justify-between items-start mb-4 border-b pb-4">
               <div>
+                <input
+                  type="checkbox"
+                  className="mr-2"
+                  checked={selected.has(order.id)}
+                  onChange={() => toggleSelected(order.id)}
+                />
                 <span className="font-bold text-lg">Pedido #{order.id}</span>
                 <div className="text-sm text-zinc-500">{new Date(order.data_hora).toLocaleString()}</div>
               </div>
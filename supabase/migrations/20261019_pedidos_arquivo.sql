@@ -0,0 +1,42 @@
+-- Order archive, filled by the API's archive job (archive_old_orders).
+-- Monthly partitions (e.g. pedidos_arquivo_2025_01) are created on demand by the job.
+CREATE TABLE IF NOT EXISTS pedidos_arquivo (
+  id INTEGER NOT NULL,
+  data_hora TIMESTAMP NOT NULL,
+  total NUMERIC(10,2),
+  status TEXT,
+  whatsapp_cliente TEXT,
+  mensagem_whatsapp TEXT,
+  PRIMARY KEY (id, data_hora)
+) PARTITION BY RANGE (data_hora);
+
+CREATE TABLE IF NOT EXISTS itens_pedido_arquivo (
+  id INTEGER NOT NULL,
+  pedido_id INTEGER NOT NULL,
+  produto_id INTEGER,
+  tipo TEXT,
+  quantidade INTEGER,
+  preco_unitario NUMERIC(10,2),
+  data_hora TIMESTAMP NOT NULL,
+  PRIMARY KEY (id, data_hora)
+) PARTITION BY RANGE (data_hora);
+
+CREATE TABLE IF NOT EXISTS meias_pizzas_arquivo (
+  id INTEGER NOT NULL,
+  item_pedido_id INTEGER NOT NULL,
+  sabor_meia TEXT,
+  data_hora TIMESTAMP NOT NULL,
+  PRIMARY KEY (id, data_hora)
+) PARTITION BY RANGE (data_hora);
+
+CREATE INDEX IF NOT EXISTS idx_pedidos_arquivo_data ON pedidos_arquivo(data_hora);
+CREATE INDEX IF NOT EXISTS idx_itens_arquivo_pedido ON itens_pedido_arquivo(pedido_id);
+CREATE INDEX IF NOT EXISTS idx_meias_arquivo_item ON meias_pizzas_arquivo(item_pedido_id);
+
+CREATE TABLE IF NOT EXISTS arquivo_meses (
+  mes DATE PRIMARY KEY,
+  pedidos INTEGER NOT NULL DEFAULT 0,
+  receita NUMERIC(12,2) NOT NULL DEFAULT 0,
+  arquivo TEXT,
+  atualizado_em TIMESTAMP
+);
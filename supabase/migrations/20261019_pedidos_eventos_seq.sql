@@ -0,0 +1,3 @@
+-- Event ids for the live order feed (/api/admin/pedidos/stream).
+-- Shared by all workers so a client can resume with Last-Event-ID on any of them.
+CREATE SEQUENCE IF NOT EXISTS pedidos_eventos_seq;
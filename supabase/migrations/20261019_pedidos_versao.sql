@@ -0,0 +1,3 @@
+-- Row version for orders: bumped on every status change so clients can apply
+-- bulk results and live events without refetching, and ignore stale ones.
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS versao INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,30 @@
+-- Product search (/api/produtos/search): Portuguese, accent-insensitive full-text
+-- index on nome/descricao plus a trigram index on the normalized name for typos.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DO $$
+DECLARE s text := (SELECT extnamespace::regnamespace::text FROM pg_extension WHERE extname = 'unaccent');
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+        EXECUTE 'CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese)';
+        EXECUTE format('ALTER TEXT SEARCH CONFIGURATION pt_unaccent ALTER MAPPING FOR hword, hword_part, word '
+                       'WITH %s.unaccent, portuguese_stem', s);
+    END IF;
+    EXECUTE format('CREATE OR REPLACE FUNCTION busca_normalizar(text) RETURNS text '
+                   'LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $f$ '
+                   'SELECT lower(%1$s.unaccent(%2$L::regdictionary, coalesce($1, ''''))) $f$',
+                   s, s || '.unaccent');
+END $$;
+
+CREATE OR REPLACE FUNCTION produto_busca(nome text, descricao text) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('pt_unaccent'::regconfig, coalesce(nome, '')), 'A')
+        || setweight(to_tsvector('pt_unaccent'::regconfig, coalesce(descricao, '')), 'B')
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_produtos_busca ON produtos USING gin (produto_busca(nome, descricao));
+
+CREATE INDEX IF NOT EXISTS idx_produtos_nome_trgm ON produtos USING gin (busca_normalizar(nome) gin_trgm_ops);
@@ -0,0 +1,31 @@
+-- Sales rollups for /api/admin/relatorios/*, maintained by the API's rollup job
+-- (refresh_sales_rollups) from a high-water mark on pedidos.id.
+CREATE TABLE IF NOT EXISTS vendas_hora (
+  hora TIMESTAMP PRIMARY KEY,
+  pedidos INTEGER NOT NULL DEFAULT 0,
+  receita NUMERIC(12,2) NOT NULL DEFAULT 0,
+  itens INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS vendas_produto_dia (
+  dia DATE NOT NULL,
+  produto_id INTEGER NOT NULL,
+  tipo VARCHAR(10) NOT NULL,
+  quantidade INTEGER NOT NULL DEFAULT 0,
+  receita NUMERIC(12,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, produto_id, tipo)
+);
+
+CREATE TABLE IF NOT EXISTS vendas_meias_dia (
+  dia DATE NOT NULL,
+  sabor_a VARCHAR(100) NOT NULL,
+  sabor_b VARCHAR(100) NOT NULL,
+  quantidade INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, sabor_a, sabor_b)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_estado (
+  nome VARCHAR(50) PRIMARY KEY,
+  ultimo_pedido_id INTEGER NOT NULL DEFAULT 0,
+  atualizado_em TIMESTAMP
+);